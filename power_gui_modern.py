@@ -1,4 +1,4 @@
-import os, sys, time, threading, subprocess, argparse, sqlite3, csv, json
+import os, sys, time, threading, subprocess, argparse, sqlite3, csv, json, zlib, struct
 from datetime import datetime, timedelta, date
 import tkinter.messagebox as mb
 from tkinter import filedialog, Toplevel, StringVar
@@ -18,6 +18,13 @@ try:
 except Exception:
     HAS_NVML = False
 
+# ====== numpy (ไม่บังคับ — ใช้เร่งการคิดค่าไฟย้อนหลัง/อ่าน trace .npy) ======
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
 APP_TITLE = "Real-time Power Monitor — Modern UI (SQLite)"
 APP_NAME  = "PowerMonitorAutoStart"
 
@@ -38,6 +45,10 @@ DEFAULT_CONFIG = {
     "gpu_idle": 8.0,
     "monitor_w": 10.0,
     "other_w": 20.0,
+    "storage": "rows",      # "rows" = 1 แถวต่อ sample, "chunks" = บีบอัดเป็นก้อนตามช่วงเวลา
+    "chunk_sec": 900.0,     # ขนาด chunk (วินาที) ต้องหาร 86400 ลงตัว และหาร 900 ลงตัวหรือเป็นพหุคูณของ 900 เช่น 60 / 900 / 3600
+    "keep_samples": False,  # True = ไม่ลบ samples ตอน rollover (เก็บประวัติย้อนหลัง)
+    "tariff": None,         # None = ราคาเดียว unit_price, หรือ dict อัตรา TOU (ดู Tariff.from_spec)
 }
 
 # ====== Prompt templates (copy-to-clipboard) ======
@@ -64,6 +75,8 @@ SAMPLE_SEC = DEFAULT_CONFIG["sample_sec"]
 CPU_TDP, CPU_IDLE = DEFAULT_CONFIG["cpu_tdp"], DEFAULT_CONFIG["cpu_idle"]
 GPU_TDP, GPU_IDLE = DEFAULT_CONFIG["gpu_tdp"], DEFAULT_CONFIG["gpu_idle"]
 MONITOR_W, OTHER_W = DEFAULT_CONFIG["monitor_w"], DEFAULT_CONFIG["other_w"]
+STORAGE, CHUNK_SEC = DEFAULT_CONFIG["storage"], DEFAULT_CONFIG["chunk_sec"]
+KEEP_SAMPLES = DEFAULT_CONFIG["keep_samples"]
 
 
 def load_config():
@@ -90,6 +103,7 @@ def save_config(cfg: dict):
 
 def apply_config_globals(cfg: dict):
     global UNIT_PRICE, SAMPLE_SEC, CPU_TDP, CPU_IDLE, GPU_TDP, GPU_IDLE, MONITOR_W, OTHER_W
+    global STORAGE, CHUNK_SEC, KEEP_SAMPLES, TARIFF, TARIFF_ERROR
     UNIT_PRICE  = float(cfg.get("unit_price", DEFAULT_CONFIG["unit_price"]))
     SAMPLE_SEC  = float(cfg.get("sample_sec", DEFAULT_CONFIG["sample_sec"]))
     CPU_TDP     = float(cfg.get("cpu_tdp", DEFAULT_CONFIG["cpu_tdp"]))
@@ -98,6 +112,17 @@ def apply_config_globals(cfg: dict):
     GPU_IDLE    = float(cfg.get("gpu_idle", DEFAULT_CONFIG["gpu_idle"]))
     MONITOR_W   = float(cfg.get("monitor_w", DEFAULT_CONFIG["monitor_w"]))
     OTHER_W     = float(cfg.get("other_w", DEFAULT_CONFIG["other_w"]))
+    STORAGE     = str(cfg.get("storage", DEFAULT_CONFIG["storage"]))
+    CHUNK_SEC   = float(cfg.get("chunk_sec", DEFAULT_CONFIG["chunk_sec"]))
+    KEEP_SAMPLES = bool(cfg.get("keep_samples", DEFAULT_CONFIG["keep_samples"]))
+    try:
+        TARIFF = Tariff.from_spec(cfg.get("tariff"), UNIT_PRICE)
+        TARIFF_ERROR = None
+    except Exception as e:
+        # ใช้ราคาเดียวไปก่อน แต่เก็บข้อความไว้ให้ GUI แจ้งผู้ใช้
+        print("tariff config warning:", e)
+        TARIFF = Tariff.flat(UNIT_PRICE)
+        TARIFF_ERROR = str(e)
 
 
 # ---------------- Power helpers ----------------
@@ -156,9 +181,98 @@ def integrate_kwh(prev_kwh, watts, dt):
     return prev_kwh + (watts * dt) / 3_600_000.0
 
 
+# ---------------- Tariff (TOU) ----------------
+_EPOCH = datetime(1970, 1, 1)
+
+def _local_sec(ts):
+    """วินาทีนับจาก 1970-01-01 ตามเวลาท้องถิ่น (naive) → หา weekday/ช่วงเวลาได้ด้วยเลขล้วน"""
+    return (ts - _EPOCH).total_seconds()
+
+
+class Tariff:
+    """อัตราค่าไฟตามช่วงเวลา: ตาราง rate คำนวณล่วงหน้าช่องละ 15 นาที
+    แถว 0–6 = จันทร์–อาทิตย์, แถว 7 = วันหยุด (holidays) → หา rate ได้ด้วย index เดียว"""
+    SLOT_SEC = 900
+    SLOTS = 96
+
+    def __init__(self, table, holidays=()):
+        if len(table) != 8 * self.SLOTS:
+            raise ValueError("ตาราง tariff ต้องมี 8 x 96 ช่อง")
+        self.table = [float(r) for r in table]
+        self.holidays = {(d - _EPOCH.date()).days for d in holidays}
+        if HAS_NUMPY:
+            self._np_table = np.asarray(self.table, dtype=np.float64)
+            self._np_holidays = np.asarray(sorted(self.holidays), dtype=np.int64)
+
+    @classmethod
+    def flat(cls, price):
+        return cls([price] * (8 * cls.SLOTS))
+
+    @classmethod
+    def from_spec(cls, spec, default_price):
+        """spec (จาก config "tariff"):
+        {"base": 2.6369,
+         "rules": [{"days": [0,1,2,3,4], "start": "09:00", "end": "22:00", "rate": 5.7982}],
+         "holidays": ["2026-01-01", ...], "holiday_rate": 2.6369}
+        rules ทับกันตามลำดับ; end <= start = ข้ามเที่ยงคืน (ส่วนหลัง 00:00 นับเป็นวันถัดไป); วันหยุดใช้ holiday_rate ทั้งวัน (ค่าเริ่มต้น = base)"""
+        if not spec:
+            return cls.flat(default_price)
+        def _slot(hhmm):
+            h, m = (int(x) for x in str(hhmm).split(":"))
+            if not (0 <= h <= 24 and 0 <= m < 60 and h*60 + m <= 1440 and m % 15 == 0):
+                raise ValueError(f"เวลาใน tariff ต้องเป็น HH:MM ทีละ 15 นาที (ได้ {hhmm!r})")
+            return (h*60 + m) // 15
+        base = float(spec.get("base", default_price))
+        table = [base] * (8 * cls.SLOTS)
+        for rule in spec.get("rules", []):
+            rate = float(rule["rate"])
+            a, b = _slot(rule.get("start", "00:00")), _slot(rule.get("end", "24:00"))
+            if a == cls.SLOTS:
+                raise ValueError("start ใน tariff เป็น 24:00 ไม่ได้ (ใช้ 00:00)")
+            days = list(rule.get("days", range(7)))
+            for d in days:
+                # แถว 7 เป็นของวันหยุด → days ต้องอยู่ใน 0–6 เท่านั้น
+                if not isinstance(d, int) or not 0 <= d <= 6:
+                    raise ValueError(f"days ใน tariff ต้องเป็นเลข 0–6 (จันทร์–อาทิตย์) (ได้ {d!r})")
+            for d in days:
+                if a < b:
+                    cells = [d*cls.SLOTS + sl for sl in range(a, b)]
+                else:
+                    # ข้ามเที่ยงคืน: ส่วนหลัง 00:00 เป็นของวันถัดไป (อาทิตย์ → จันทร์)
+                    cells = [d*cls.SLOTS + sl for sl in range(a, cls.SLOTS)]
+                    cells += [(d + 1) % 7 * cls.SLOTS + sl for sl in range(0, b)]
+                for i in cells:
+                    table[i] = rate
+        hol = float(spec.get("holiday_rate", base))
+        table[7*cls.SLOTS:] = [hol] * cls.SLOTS
+        return cls(table, [date.fromisoformat(d) for d in spec.get("holidays", [])])
+
+    def _index(self, sec):
+        day = int(sec // 86400)
+        row = 7 if day in self.holidays else (day + 3) % 7   # 1970-01-01 = พฤหัส (weekday 3)
+        return row * self.SLOTS + int(sec % 86400 // self.SLOT_SEC)
+
+    def rate_at(self, ts):
+        return self.table[self._index(_local_sec(ts))]
+
+    def cost_slots(self, slots, e_kwh):
+        """ค่าไฟรวมของพลังงาน e_kwh[i] ในช่อง 15 นาทีที่ slots[i] (= _local_sec // SLOT_SEC)
+        store รวมพลังงานต่อช่องมาให้แล้ว → 1 ปีไม่เกิน ~35k ช่อง วนใน Python ได้สบาย; ใช้ numpy ถ้ามี"""
+        if HAS_NUMPY:
+            sl = np.asarray(slots, dtype=np.int64)
+            day = sl // self.SLOTS
+            row = np.where(np.isin(day, self._np_holidays), 7, (day + 3) % 7)
+            return float(np.dot(np.asarray(e_kwh, dtype=np.float64), self._np_table[row * self.SLOTS + sl % self.SLOTS]))
+        return sum(e * self.table[self._index(sl * self.SLOT_SEC)] for sl, e in zip(slots, e_kwh))
+
+
+TARIFF = Tariff.flat(UNIT_PRICE)
+TARIFF_ERROR = None   # ข้อความ error ของ "tariff" ใน config ล่าสุด (None = ใช้ได้)
+
+
 # ---------------- SQLite ----------------
-def ensure_db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+def ensure_db(path=None):
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False)
     cur = conn.cursor()
     # per-second (เฉพาะวันนี้)
     cur.execute("""
@@ -170,6 +284,8 @@ def ensure_db():
         kwh REAL NOT NULL,
         cost REAL NOT NULL
     )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_day ON samples(day)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples(ts)")
     # daily summary
     cur.execute("""
     CREATE TABLE IF NOT EXISTS daily_summary (
@@ -181,6 +297,30 @@ def ensure_db():
         max_watts REAL NOT NULL,
         last_watts REAL NOT NULL   -- sample สุดท้ายของวัน
     )""")
+    # chunked samples (storage="chunks") — 1 แถวต่อช่วง CHUNK_SEC, ข้อมูลดิบอยู่ใน data (BLOB)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sample_chunks (
+        chunk_start TEXT PRIMARY KEY,  -- ISO datetime ต้น chunk
+        day TEXT NOT NULL,             -- YYYY-MM-DD
+        n INTEGER NOT NULL,            -- จำนวน sample
+        t_first INTEGER NOT NULL,      -- epoch ms ของ sample แรก
+        t_last INTEGER NOT NULL,       -- epoch ms ของ sample สุดท้าย
+        w_min REAL NOT NULL,
+        w_max REAL NOT NULL,
+        w_sum REAL NOT NULL,
+        w_last REAL NOT NULL,
+        kwh_first REAL NOT NULL,
+        kwh_last REAL NOT NULL,
+        kwh_sum REAL NOT NULL,         -- พลังงานที่ใช้ใน chunk นี้ (ผลรวม delta)
+        cost_first REAL NOT NULL,
+        cost_last REAL NOT NULL,
+        data BLOB NOT NULL,            -- zlib(varint: delta-of-delta ts, delta watts x10)
+        slot_kwh BLOB                  -- พลังงานแยกตามช่อง 15 นาทีใน chunk (float64 little-endian)
+    )""")
+    # DB เก่าที่สร้างก่อนมี slot_kwh → เพิ่มคอลัมน์ (แถวเก่าเป็น NULL, reprice จะ decode แทน)
+    if "slot_kwh" not in [r[1] for r in cur.execute("PRAGMA table_info(sample_chunks)")]:
+        cur.execute("ALTER TABLE sample_chunks ADD COLUMN slot_kwh BLOB")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sample_chunks_day ON sample_chunks(day)")
     conn.commit()
     return conn
 
@@ -204,30 +344,34 @@ def insert_sample(conn, ts, watts, kwh, cost):
     conn.commit()
 
 
+def _upsert_daily_summary(conn, day, kwh, cost, seconds, avg_watts, max_watts, last_watts):
+    conn.execute("""
+        INSERT INTO daily_summary (day, kwh, cost, seconds, avg_watts, max_watts, last_watts)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(day) DO UPDATE SET
+            kwh=excluded.kwh, cost=excluded.cost, seconds=excluded.seconds,
+            avg_watts=excluded.avg_watts, max_watts=excluded.max_watts, last_watts=excluded.last_watts
+    """, (day, float(kwh), float(cost), float(seconds), float(avg_watts or 0.0),
+          float(max_watts or 0.0), float(last_watts or 0.0)))
+    conn.commit()
+
+
 def summarize_day(conn, day):
     cur = conn.cursor()
     # ใช้ค่าสะสมต้นวันและปลายวัน
-    cur.execute("SELECT MIN(kwh), MAX(kwh), MAX(watts), AVG(watts), COUNT(*) FROM samples WHERE day=?", (day,))
+    cur.execute("SELECT MIN(kwh), MAX(kwh), MAX(watts), AVG(watts), COUNT(*), MIN(cost), MAX(cost) FROM samples WHERE day=?", (day,))
     row = cur.fetchone()
     if not row or row[4] == 0:
         return False
-    kwh_min, kwh_max, max_watts, avg_watts, count = row
+    kwh_min, kwh_max, max_watts, avg_watts, count, cost_min, cost_max = row
     kwh_day = max(0.0, (kwh_max or 0.0) - (kwh_min or 0.0))
     # เวลาจริงของวัน
     cur.execute("SELECT MIN(ts), MAX(ts) FROM samples WHERE day=?", (day,))
     tmin, tmax = cur.fetchone()
     seconds = (datetime.fromisoformat(tmax) - datetime.fromisoformat(tmin)).total_seconds() if (tmin and tmax) else count * SAMPLE_SEC
-    cost = kwh_day * UNIT_PRICE
-    cur.execute("""
-        INSERT INTO daily_summary (day, kwh, cost, seconds, avg_watts, max_watts, last_watts)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(day) DO UPDATE SET
-            kwh=excluded.kwh, cost=excluded.cost, seconds=excluded.seconds,
-            avg_watts=excluded.avg_watts, max_watts=excluded.max_watts, last_watts=excluded.last_watts
-    """, (day, float(kwh_day), float(cost), float(seconds), float(avg_watts or 0.0),
-          float(max_watts or 0.0),
-          float(cur.execute("SELECT watts FROM samples WHERE day=? ORDER BY id DESC LIMIT 1",(day,)).fetchone()[0])))
-    conn.commit()
+    cost = max(0.0, (cost_max or 0.0) - (cost_min or 0.0))
+    last_watts = cur.execute("SELECT watts FROM samples WHERE day=? ORDER BY id DESC LIMIT 1",(day,)).fetchone()[0]
+    _upsert_daily_summary(conn, day, kwh_day, cost, seconds, avg_watts, max_watts, last_watts)
     return True
 
 
@@ -257,6 +401,552 @@ def export_month_csv(conn, yyyymm, path):
     return path
 
 
+# ---------------- Storage backends ----------------
+# ทั้งสอง backend มี interface เดียวกัน: insert_sample / summarize_day / delete_samples_of_day /
+# iter_samples / range_stats / flush  → App เลือกใช้ตาม config "storage"
+class RowStore:
+    """1 แถวต่อ sample ในตาราง samples (แบบเดิม)"""
+    kind = "rows"
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def insert_sample(self, ts, watts, kwh, cost): insert_sample(self.conn, ts, watts, kwh, cost)
+    def summarize_day(self, day): return summarize_day(self.conn, day)
+    def delete_samples_of_day(self, day): delete_samples_of_day(self.conn, day)
+    def flush(self): pass
+
+    def iter_samples(self, day=None):
+        """yield (ts, watts, kwh, cost) เรียงตามเวลา"""
+        if day is None:
+            rows = self.conn.execute("SELECT ts, watts, kwh, cost FROM samples ORDER BY id")
+        else:
+            rows = self.conn.execute("SELECT ts, watts, kwh, cost FROM samples WHERE day=? ORDER BY id", (day,))
+        for ts, watts, kwh, cost in rows:
+            yield datetime.fromisoformat(ts), watts, kwh, cost
+
+    def range_stats(self, t0, t1):
+        """สถิติช่วง [t0, t1): คืน dict(n, w_sum, w_min, w_max) หรือ None ถ้าไม่มีข้อมูล"""
+        n, w_sum, w_min, w_max = self.conn.execute(
+            "SELECT COUNT(*), SUM(watts), MIN(watts), MAX(watts) FROM samples WHERE ts>=? AND ts<?",
+            (t0.isoformat(), t1.isoformat())).fetchone()
+        if not n:
+            return None
+        return {"n": n, "w_sum": w_sum, "w_min": w_min, "w_max": w_max}
+
+    def reprice(self, tariff, t0, t1):
+        """คิดค่าไฟช่วง [t0, t1) ใหม่ด้วย tariff อื่น → คืน (kwh, cost)
+        kWh เป็นค่าสะสม → พลังงานในช่อง 15 นาที = kWh ของ sample สุดท้ายก่อนขอบปลาย − ก่อนขอบต้น
+        จึง seek index ts ครั้งเดียวต่อขอบช่อง (ทั้งปี ~35k ครั้ง) ไม่ต้องไล่ทุกแถว
+        ts เป็นเวลาท้องถิ่นแบบ naive → strftime('%s') ได้ค่าเดียวกับ _local_sec"""
+        # MIN/MAX แยก query → SQLite seek index ได้ (รวมกันจะ scan ทั้งตาราง)
+        lo = self.conn.execute("SELECT MIN(ts) FROM samples").fetchone()[0]
+        hi = self.conn.execute("SELECT MAX(ts) FROM samples").fetchone()[0]
+        if lo is None:
+            return 0.0, 0.0
+        # ตัดช่วงให้เหลือเฉพาะที่มีข้อมูล (ไม่ต้องไล่ขอบช่องของปีที่ว่าง)
+        a = max(t0, datetime.fromisoformat(lo)).isoformat()
+        b = min(t1, datetime.fromisoformat(hi) + timedelta(seconds=1)).isoformat()
+        if a >= b:
+            return 0.0, 0.0
+        rows = self.conn.execute(f"""
+            WITH RECURSIVE edge(t) AS (
+                SELECT :a
+                UNION ALL
+                SELECT MIN(:b, strftime('%Y-%m-%dT%H:%M:%S',
+                       (CAST(strftime('%s', t) AS INTEGER) / {Tariff.SLOT_SEC} + 1) * {Tariff.SLOT_SEC}, 'unixepoch'))
+                FROM edge WHERE t < :b)
+            SELECT t, CAST(strftime('%s', t) AS INTEGER) / {Tariff.SLOT_SEC},
+                   (SELECT kwh FROM samples WHERE ts < edge.t ORDER BY ts DESC LIMIT 1)
+            FROM edge
+        """, {"a": a, "b": b}).fetchall()
+        first = self.conn.execute("SELECT kwh FROM samples WHERE ts=?", (lo,)).fetchone()
+        slots, e_kwh = [], []
+        for (ta, slot, ka), (tb, _, kb) in zip(rows, rows[1:]):
+            if kb is None:
+                continue
+            if ka is None:
+                ka = first[0]   # ยังไม่มี sample ก่อนหน้า: sample แรกของ DB ไม่มีพลังงานสะสมให้นับ
+            e = kb - ka
+            if e < 0:
+                # kWh ลดลงในช่องนี้ (reset เดือน / state เก่าหลังรีสตาร์ท) → นับเฉพาะ delta บวกทีละ sample ด้วย LAG
+                e = self.conn.execute("""
+                    SELECT COALESCE(SUM(e), 0.0) FROM (
+                        SELECT MAX(0.0, kwh - LAG(kwh) OVER (ORDER BY ts)) AS e FROM samples
+                        WHERE ts >= COALESCE((SELECT MAX(ts) FROM samples WHERE ts < :a), :a) AND ts < :b)
+                """, {"a": ta, "b": tb}).fetchone()[0]
+            if e:
+                slots.append(slot); e_kwh.append(e)
+        return sum(e_kwh), tariff.cost_slots(slots, e_kwh)
+
+
+def _put_varint(buf, v):
+    # zigzag + LEB128 (ค่าติดลบได้)
+    v = (v << 1) ^ (v >> 63)
+    while v >= 0x80:
+        buf.append((v & 0x7F) | 0x80); v >>= 7
+    buf.append(v)
+
+
+def _read_varints(data):
+    out = []; v = 0; shift = 0
+    for b in data:
+        v |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            out.append((v >> 1) ^ -(v & 1)); v = 0; shift = 0
+    return out
+
+
+def encode_chunk(t_ms, w_q):
+    """t_ms = epoch ms (int), w_q = watts x10 (int) → bytes
+    timestamps เก็บเป็น delta-of-delta (sample ถี่คงที่ → ส่วนใหญ่เป็น 0), watts เก็บเป็น delta"""
+    buf = bytearray()
+    prev_t, prev_d, prev_w = t_ms[0], 0, 0
+    for t, w in zip(t_ms, w_q):
+        d = t - prev_t
+        _put_varint(buf, d - prev_d)
+        _put_varint(buf, w - prev_w)
+        prev_t, prev_d, prev_w = t, d, w
+    return zlib.compress(bytes(buf), 6)
+
+
+def decode_chunk(t_first, data):
+    """คืน (t_ms list, watts list)"""
+    vals = _read_varints(zlib.decompress(data))
+    t_ms, watts = [], []
+    t, d, w = t_first, 0, 0
+    for i in range(0, len(vals), 2):
+        d += vals[i]; t += d; w += vals[i+1]
+        t_ms.append(t); watts.append(w / 10.0)
+    return t_ms, watts
+
+
+def _split_energy(t_ms, watts, e_sum):
+    """แบ่งพลังงานของ chunk (e_sum) ให้แต่ละ sample ตามสัดส่วน watts x dt"""
+    dts = [t_ms[1] - t_ms[0] if len(t_ms) > 1 else SAMPLE_SEC * 1000]
+    dts += [t_ms[i] - t_ms[i-1] for i in range(1, len(t_ms))]
+    parts = [w * d for w, d in zip(watts, dts)]
+    total = sum(parts) or 1.0
+    return [e_sum * p / total for p in parts]
+
+
+class ChunkStore:
+    """เก็บ samples เป็นก้อนละ CHUNK_SEC วินาทีในตาราง sample_chunks
+    header ของแต่ละก้อน (n, min/max/sum watts, kWh ต้น/ปลาย) ทำให้สรุปช่วงเวลาไม่ต้อง decode"""
+    kind = "chunks"
+    FLUSH_EVERY = 60   # เขียน chunk ที่ยังเปิดอยู่ลง DB ทุก ๆ N samples (กันข้อมูลหายถ้าโปรแกรมปิดกะทันหัน)
+
+    def __init__(self, conn, chunk_sec=None):
+        self.conn = conn
+        self.chunk_sec = int(chunk_sec or CHUNK_SEC)
+        if self.chunk_sec <= 0 or 86400 % self.chunk_sec:
+            raise ValueError(f"chunk_sec ต้องหาร 86400 ลงตัว (ได้ {self.chunk_sec})")
+        # ขอบ chunk ต้องตรงกับขอบช่อง 15 นาทีของ tariff → แยกพลังงานต่อช่องไว้ใน header ได้
+        if Tariff.SLOT_SEC % self.chunk_sec and self.chunk_sec % Tariff.SLOT_SEC:
+            raise ValueError(f"chunk_sec ต้องหาร {Tariff.SLOT_SEC} ลงตัวหรือเป็นพหุคูณของ {Tariff.SLOT_SEC} (ได้ {self.chunk_sec})")
+        self._nslots = max(1, self.chunk_sec // Tariff.SLOT_SEC)
+        self._key = None; self._day = None
+        self._t = []; self._w = []; self._dirty = 0
+        self._lock = threading.RLock()   # insert มาจาก thread loop, flush อาจมาจาก GUI (stop/quit)
+        row = conn.execute("SELECT kwh_last FROM sample_chunks ORDER BY t_last DESC LIMIT 1").fetchone()
+        self._last_kwh = row[0] if row else None
+
+    def _chunk_start(self, ts):
+        secs = ts.hour*3600 + ts.minute*60 + ts.second
+        midnight = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight + timedelta(seconds=secs - secs % self.chunk_sec)
+
+    def insert_sample(self, ts, watts, kwh, cost):
+        with self._lock:
+            self._insert(ts, watts, kwh, cost)
+
+    def _insert(self, ts, watts, kwh, cost):
+        key = self._chunk_start(ts).isoformat()
+        if key != self._key:
+            self._flush()
+            self._open(key, today_str(ts))
+        watts = float(watts); kwh = float(kwh); cost = float(cost)
+        # kWh สะสมลดลงได้ (reset เดือน / state เก่าหลังรีสตาร์ท) → ไม่นับ delta ติดลบ
+        inc = 0.0 if self._last_kwh is None else max(0.0, kwh - self._last_kwh)
+        self._last_kwh = kwh
+        h = self._h
+        if h["n"] == 0:
+            h.update(w_min=watts, w_max=watts, kwh_first=kwh, cost_first=cost)
+        h["n"] += 1
+        h["w_min"] = min(h["w_min"], watts); h["w_max"] = max(h["w_max"], watts)
+        h["w_sum"] += watts; h["w_last"] = watts
+        h["kwh_last"] = kwh; h["kwh_sum"] += inc; h["cost_last"] = cost
+        if self._nslots > 1:
+            self._slot_e[(ts.hour*3600 + ts.minute*60 + ts.second) % self.chunk_sec // Tariff.SLOT_SEC] += inc
+        else:
+            self._slot_e[0] += inc
+        self._t.append(int(round(ts.timestamp() * 1000))); self._w.append(int(round(watts * 10)))
+        self._dirty += 1
+        if self._dirty >= self.FLUSH_EVERY:
+            self._flush()
+
+    def _open(self, key, day):
+        self._key, self._day = key, day
+        row = self.conn.execute(
+            "SELECT n, t_first, w_min, w_max, w_sum, w_last, kwh_first, kwh_last, kwh_sum, cost_first, cost_last, data, slot_kwh "
+            "FROM sample_chunks WHERE chunk_start=?", (key,)).fetchone()
+        self._slot_e = [0.0] * self._nslots
+        if row:
+            # ต่อ chunk เดิม (เช่น รีสตาร์ทโปรแกรมกลางช่วง)
+            n, t_first, w_min, w_max, w_sum, w_last, kf, kl, ks, cf, cl, data, slot_kwh = row
+            self._t, w = decode_chunk(t_first, data)
+            self._w = [int(round(x * 10)) for x in w]
+            if slot_kwh is not None and len(slot_kwh) == 8 * self._nslots:
+                self._slot_e = list(struct.unpack(f"<{self._nslots}d", slot_kwh))
+            else:
+                # แถวเก่าไม่มี slot_kwh (หรือขนาด chunk เปลี่ยน) → แบ่งจาก samples
+                start = _local_sec(datetime.fromisoformat(key))
+                offset = _local_sec(datetime.fromtimestamp(t_first / 1000.0)) - t_first / 1000.0
+                for t, e in zip(self._t, _split_energy(self._t, w, ks)):
+                    i = int((t / 1000.0 + offset - start) // Tariff.SLOT_SEC)
+                    self._slot_e[min(max(i, 0), self._nslots - 1)] += e
+            self._h = {"n": n, "w_min": w_min, "w_max": w_max, "w_sum": w_sum, "w_last": w_last,
+                       "kwh_first": kf, "kwh_last": kl, "kwh_sum": ks, "cost_first": cf, "cost_last": cl}
+        else:
+            self._t, self._w = [], []
+            self._h = {"n": 0, "w_min": 0.0, "w_max": 0.0, "w_sum": 0.0, "w_last": 0.0,
+                       "kwh_first": 0.0, "kwh_last": 0.0, "kwh_sum": 0.0, "cost_first": 0.0, "cost_last": 0.0}
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._key or not self._t or not self._dirty:
+            return
+        h = self._h
+        self.conn.execute("""
+            INSERT OR REPLACE INTO sample_chunks
+            (chunk_start, day, n, t_first, t_last, w_min, w_max, w_sum, w_last,
+             kwh_first, kwh_last, kwh_sum, cost_first, cost_last, data, slot_kwh)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (self._key, self._day, h["n"], self._t[0], self._t[-1], h["w_min"], h["w_max"], h["w_sum"],
+              h["w_last"], h["kwh_first"], h["kwh_last"], h["kwh_sum"], h["cost_first"], h["cost_last"],
+              encode_chunk(self._t, self._w), struct.pack(f"<{self._nslots}d", *self._slot_e)))
+        self.conn.commit()
+        self._dirty = 0
+
+    def summarize_day(self, day):
+        self.flush()
+        cur = self.conn.cursor()
+        cur.execute("SELECT SUM(n), MIN(t_first), MAX(t_last), MIN(w_min), MAX(w_max), SUM(w_sum) "
+                    "FROM sample_chunks WHERE day=?", (day,))
+        n, tmin, tmax, w_min, max_watts, w_sum = cur.fetchone()
+        if not n:
+            return False
+        kwh_first, cost_first = cur.execute(
+            "SELECT kwh_first, cost_first FROM sample_chunks WHERE day=? ORDER BY chunk_start LIMIT 1", (day,)).fetchone()
+        kwh_last, cost_last, last_watts = cur.execute(
+            "SELECT kwh_last, cost_last, w_last FROM sample_chunks WHERE day=? ORDER BY chunk_start DESC LIMIT 1", (day,)).fetchone()
+        kwh_day = max(0.0, kwh_last - kwh_first)
+        cost_day = max(0.0, cost_last - cost_first)
+        seconds = (tmax - tmin) / 1000.0
+        _upsert_daily_summary(self.conn, day, kwh_day, cost_day, seconds, w_sum / n, max_watts, last_watts)
+        return True
+
+    def delete_samples_of_day(self, day):
+        self.flush()
+        self.conn.execute("DELETE FROM sample_chunks WHERE day=?", (day,))
+        self.conn.commit()
+        if self._day == day:
+            self._key = None; self._t, self._w = [], []
+
+    def iter_samples(self, day=None):
+        """yield (ts, watts, kwh, cost) — kWh/ค่าไฟรายตัวประมาณจากการ integrate watts
+        แล้วปรับสเกลให้ตรงกับค่าต้น/ปลายที่เก็บไว้ใน header"""
+        self.flush()
+        q = "SELECT t_first, kwh_first, kwh_last, cost_first, cost_last, data FROM sample_chunks"
+        rows = self.conn.execute(q + " ORDER BY chunk_start") if day is None else \
+            self.conn.execute(q + " WHERE day=? ORDER BY chunk_start", (day,))
+        for t_first, kf, kl, cf, cl, data in rows:
+            t_ms, watts = decode_chunk(t_first, data)
+            acc = [0.0]
+            for i in range(1, len(t_ms)):
+                acc.append(acc[-1] + watts[i] * (t_ms[i] - t_ms[i-1]) / 3_600_000_000.0)
+            scale = (kl - kf) / acc[-1] if acc[-1] > 0 else 0.0
+            for t, w, a in zip(t_ms, watts, acc):
+                kwh = kf + a * scale
+                cost = cf + ((kwh - kf) / (kl - kf) if kl > kf else 0.0) * (cl - cf)
+                yield datetime.fromtimestamp(t / 1000.0), w, kwh, cost
+
+    def range_stats(self, t0, t1):
+        """เหมือน RowStore.range_stats — chunk ที่อยู่ในช่วงทั้งก้อนใช้ header, decode เฉพาะก้อนที่คาบขอบ"""
+        self.flush()
+        a = int(round(t0.timestamp() * 1000)); b = int(round(t1.timestamp() * 1000))
+        n, w_sum, w_min, w_max = self.conn.execute(
+            "SELECT SUM(n), SUM(w_sum), MIN(w_min), MAX(w_max) FROM sample_chunks WHERE t_first>=? AND t_last<?",
+            (a, b)).fetchone()
+        n = n or 0; w_sum = w_sum or 0.0
+        edges = self.conn.execute(
+            "SELECT t_first, data FROM sample_chunks WHERE t_last>=? AND t_first<? AND NOT (t_first>=? AND t_last<?)",
+            (a, b, a, b)).fetchall()
+        for t_first, data in edges:
+            for t, w in zip(*decode_chunk(t_first, data)):
+                if a <= t < b:
+                    n += 1; w_sum += w
+                    w_min = w if w_min is None else min(w_min, w)
+                    w_max = w if w_max is None else max(w_max, w)
+        if not n:
+            return None
+        return {"n": n, "w_sum": w_sum, "w_min": w_min, "w_max": w_max}
+
+    def reprice(self, tariff, t0, t1):
+        """เหมือน RowStore.reprice — chunk ที่อยู่ในช่วงทั้งก้อนใช้พลังงานต่อช่อง 15 นาทีจาก header (slot_kwh)
+        ไม่ต้อง decode; decode เฉพาะก้อนที่คาบขอบช่วง (และแถวเก่าที่ยังไม่มี slot_kwh)"""
+        self.flush()
+        a = int(round(t0.timestamp() * 1000)); b = int(round(t1.timestamp() * 1000))
+        whole = "t_first>=:a AND t_last<:b AND slot_kwh IS NOT NULL"
+        start = f"CAST(strftime('%s', chunk_start) AS INTEGER) / {Tariff.SLOT_SEC}"
+        # chunk ≤ 15 นาที: ทั้งก้อนอยู่ช่องเดียว → รวมใน SQL ได้เลย
+        by_slot = dict(self.conn.execute(
+            f"SELECT {start}, SUM(kwh_sum) FROM sample_chunks WHERE {whole} AND length(slot_kwh) = 8 GROUP BY 1",
+            {"a": a, "b": b}).fetchall())
+        # chunk หลายช่อง (เช่น 1 ชั่วโมง = 4 ช่อง): แตก slot_kwh
+        for first, blob in self.conn.execute(
+                f"SELECT {start}, slot_kwh FROM sample_chunks WHERE {whole} AND length(slot_kwh) > 8", {"a": a, "b": b}):
+            for i, e in enumerate(struct.unpack(f"<{len(blob) // 8}d", blob)):
+                by_slot[first + i] = by_slot.get(first + i, 0.0) + e
+        for t_first, e_sum, data in self.conn.execute(
+                f"SELECT t_first, kwh_sum, data FROM sample_chunks WHERE t_last>=:a AND t_first<:b AND NOT ({whole})",
+                {"a": a, "b": b}):
+            t_ms, watts = decode_chunk(t_first, data)
+            offset = _local_sec(datetime.fromtimestamp(t_first / 1000.0)) - t_first / 1000.0
+            for t, e in zip(t_ms, _split_energy(t_ms, watts, e_sum)):
+                if a <= t < b:
+                    sl = int((t / 1000.0 + offset) // Tariff.SLOT_SEC)
+                    by_slot[sl] = by_slot.get(sl, 0.0) + e
+        return sum(by_slot.values()), tariff.cost_slots(list(by_slot), list(by_slot.values()))
+
+
+def open_store(conn, kind=None):
+    kind = kind or STORAGE
+    if kind == "rows": return RowStore(conn)
+    if kind == "chunks": return ChunkStore(conn)
+    raise ValueError(f"storage ไม่รู้จัก: {kind!r} (ใช้ 'rows' หรือ 'chunks')")
+
+
+def convert_store(src, dst):
+    """คัดลอก samples ทั้งหมดจาก backend หนึ่งไปอีก backend (เช่น rows → chunks) คืนจำนวนที่ย้าย"""
+    count = 0
+    for ts, watts, kwh, cost in src.iter_samples():
+        dst.insert_sample(ts, watts, kwh, cost); count += 1
+    dst.flush()
+    return count
+
+
+# ---------------- Collector (ไม่ผูกกับ GUI) ----------------
+class Collector:
+    """pipeline เก็บข้อมูล: integrate kWh → store.insert_sample → rollover รายวัน → state.json
+    ใช้ร่วมกันระหว่าง App (เวลาจริง) และ Replay (ป้อน trace ผ่าน clock ที่ฉีดเข้ามา)"""
+
+    def _init_collector(self, conn=None, state_path=None, clock=None):
+        self.clock = clock or datetime.now
+        self.state_path = state_path or STATE_JSON
+        self.conn = conn or ensure_db()
+        self.store = open_store(self.conn)
+        self._t0 = None
+        self._kwh=0.0; self._cost=0.0; self._watts=0.0; self._gpu_w=0.0
+        self._cur_day = None
+
+    def _start_session(self):
+        # เริ่ม session (เปิดโปรแกรม): วันปัจจุบันตาม clock + resume ค่าสะสมเดือนจาก state.json
+        self._cur_day = today_str(self.clock())
+        self._resume_state()
+
+    # ---------- state persistence ----------
+    def _resume_state(self):
+        now = self.clock()
+        try:
+            with open(self.state_path,"r",encoding="utf-8") as f:
+                s=json.load(f)
+            mk = s.get("month_key", month_key(now))
+            if mk == month_key(now):
+                self._kwh = s.get("kwh",0.0); self._cost = s.get("cost",0.0)
+                t0 = s.get("t0"); self._t0 = datetime.fromisoformat(t0) if t0 else now
+            else:
+                self._kwh = 0.0; self._cost = 0.0; self._t0 = now
+        except Exception:
+            self._kwh = 0.0; self._cost = 0.0; self._t0 = now
+        self._save_state()
+
+    def _save_state(self):
+        obj={"month_key":month_key(self.clock()), "kwh":self._kwh, "cost":self._cost, "t0":self._t0.isoformat() if self._t0 else None}
+        try:
+            with open(self.state_path,"w",encoding="utf-8") as f: json.dump(obj,f,indent=2)
+        except: pass
+
+    # ---------- core ----------
+    def _rollover_if_needed(self, now):
+        # ถ้าข้ามวันจาก self._cur_day → สรุป self._cur_day ลง daily_summary แล้วลบ samples ของวันนั้น
+        day_now = today_str(now)
+        if day_now != self._cur_day:
+            try:
+                self.store.summarize_day(self._cur_day)
+                if not KEEP_SAMPLES:
+                    self.store.delete_samples_of_day(self._cur_day)
+            except Exception as e:
+                # ไม่หยุดโปรแกรม แค่แจ้งเตือนใน console
+                print("rollover error:", e)
+            # ข้ามเดือน → เริ่มค่าสะสมเดือนใหม่ (ไม่งั้น state.json จะติด month_key ใหม่พร้อม kWh ของเดือนเก่า)
+            if day_now[:7] != self._cur_day[:7]:
+                self._kwh = 0.0; self._cost = 0.0; self._t0 = now
+            self._cur_day = day_now
+
+    def _sample(self, now, dt, cpu_util, gpu_w, save_state=True):
+        """ประมวลผล 1 sample: cpu_util (%), gpu_w (W), dt = วินาทีนับจาก sample ก่อนหน้า"""
+        self._rollover_if_needed(now)
+
+        watts = estimate_cpu_w(cpu_util) + gpu_w + MONITOR_W + OTHER_W
+        prev_kwh = self._kwh
+        self._kwh = integrate_kwh(self._kwh, watts, dt)
+        # สะสมค่าไฟทีละ sample ตาม rate ของช่วงเวลานั้น (เปลี่ยนราคาแล้วไม่ย้อนคิดทั้งเดือน)
+        self._cost += (self._kwh - prev_kwh) * TARIFF.rate_at(now)
+        self._watts = watts; self._gpu_w = gpu_w
+
+        # เก็บ sample เฉพาะวันนี้ (เมื่อ rollover แล้วของเมื่อวานถูกลบไปแล้ว)
+        try:
+            self.store.insert_sample(now, watts, self._kwh, self._cost)
+        except Exception as e:
+            print("insert sample error:", e)
+
+        # บันทึก state เดือน (เพื่อจำต่อเนื่องข้ามการรีสตาร์ท)
+        if save_state:
+            self._save_state()
+
+
+# ---------------- Replay / simulation ----------------
+def load_trace(path):
+    """อ่าน trace (timestamp, cpu_util %, gpu watts) จาก CSV หรือ .npy
+    timestamp เป็น ISO datetime หรือ epoch วินาที; CSV มี header ได้ (บรรทัดที่แปลงเป็นตัวเลข/เวลาไม่ได้จะถูกข้าม)"""
+    def _ts(v):
+        try: return datetime.fromtimestamp(float(v))
+        except ValueError: return datetime.fromisoformat(str(v).strip())
+    if path.lower().endswith(".npy"):
+        if not HAS_NUMPY:
+            raise RuntimeError("อ่าน .npy ต้องติดตั้ง numpy ก่อน (pip install numpy)")
+        for t, cpu, gpu in np.load(path):
+            yield datetime.fromtimestamp(float(t)), float(cpu), float(gpu)
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 3: continue
+            try:
+                yield _ts(row[0]), float(row[1]), float(row[2])
+            except ValueError:
+                continue
+
+
+def synthetic_trace(start, days, step=None, seed=0):
+    """trace จำลอง: เปิดเครื่อง 08:00–01:00 (ปิดช่วงกลางคืน → จำลองการรีสตาร์ทโปรแกรม),
+    โหลด CPU/GPU แกว่งตามเวลาของวัน + noise"""
+    import math, random
+    rnd = random.Random(seed)
+    step = step or SAMPLE_SEC
+    t = start; end = start + timedelta(days=days); dt = timedelta(seconds=step)
+    while t < end:
+        h = t.hour + t.minute / 60.0
+        if 1.0 <= h < 8.0:
+            t = t.replace(hour=8, minute=0, second=0, microsecond=0); continue
+        load = 0.5 + 0.4 * math.sin((h - 10.0) / 24.0 * 2 * math.pi)
+        cpu = min(100.0, max(0.0, 100.0 * load * rnd.uniform(0.3, 1.2)))
+        gpu = GPU_IDLE + (GPU_TDP - GPU_IDLE) * load * rnd.uniform(0.0, 1.0)
+        yield t, cpu, gpu
+        t += dt
+
+
+class Replay(Collector):
+    """ป้อน trace ผ่าน pipeline เดียวกับ App (integrate → insert_sample → rollover → state)
+    ด้วย clock จำลอง เร็วเท่าที่ storage รับไหว ใช้ทดสอบ rollover/reset เดือน และประเมินขนาด DB"""
+    RESTART_GAP = 300.0   # trace ขาดช่วงนานกว่านี้ (วินาที) = ถือว่าปิด/เปิดโปรแกรมใหม่
+
+    def __init__(self, db_path, fsync=False):
+        # เริ่มจาก DB/state ว่างทุกครั้ง ให้ผลซ้ำได้ — แต่ลบเฉพาะไฟล์ที่ replay สร้างเองเท่านั้น
+        self.db_path = db_path
+        state_path = db_path + ".state.json"
+        real = {os.path.abspath(DB_PATH), os.path.abspath(STATE_JSON)}
+        if os.path.abspath(db_path) in real or os.path.abspath(state_path) in real:
+            raise ValueError(f"replay ใช้ DB จริงไม่ได้: {db_path}")
+        if os.path.exists(db_path):
+            if not self._is_replay_db(db_path):
+                raise ValueError(f"{db_path} ไม่ใช่ DB ที่ replay สร้างไว้ (ไม่มีตาราง replay_info) — ไม่ลบให้")
+            os.remove(db_path)
+            if os.path.exists(state_path): os.remove(state_path)
+        conn = ensure_db(db_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS replay_info (created TEXT NOT NULL)")
+        conn.execute("INSERT INTO replay_info VALUES (?)", (datetime.now().isoformat(),)); conn.commit()
+        if not fsync:
+            conn.execute("PRAGMA synchronous=OFF")
+        self._now = None
+        self._init_collector(conn, state_path, clock=lambda: self._now)
+
+    @staticmethod
+    def _is_replay_db(path):
+        try:
+            conn = sqlite3.connect(path)   # เรียกเฉพาะเมื่อไฟล์มีอยู่แล้ว จึงไม่สร้างไฟล์ใหม่
+            try:
+                return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='replay_info'").fetchone() is not None
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return False
+
+    def _restart(self, now):
+        # เหมือนปิดแล้วเปิด App ใหม่: flush + save state (เหมือน stop), เริ่มวันปัจจุบันใหม่, resume state (reset ถ้าข้ามเดือน)
+        self.store.flush(); self._save_state()
+        self._now = now
+        self._start_session()
+
+    def run(self, trace, state_every=1, progress=None):
+        """คืน dict สรุป: จำนวน sample, ความเร็ว, rollover latency, restart, ขนาด DB"""
+        rollover_ms = []; restarts = 0; n = 0; last = None; first = None
+        wall0 = time.perf_counter()
+        for ts, cpu, gpu in trace:
+            if last is None:
+                # session แรกเริ่มเมื่อรู้เวลาของ sample แรกแล้ว (ก่อนหน้านี้ clock ยังไม่มีค่า)
+                self._now = ts; self._start_session()
+                first = ts; dt = 0.0
+            else:
+                dt = (ts - last).total_seconds()
+                if dt < 0:
+                    # ย้อนเวลาจะทำให้ integrate_kwh ลบพลังงานออก → ไม่รับ trace แบบนี้
+                    raise ValueError(f"trace ต้องเรียงเวลา: sample #{n+1} ({ts.isoformat()}) "
+                                     f"ย้อนจาก {last.isoformat()} ไป {-dt:,.0f} วินาที")
+                if dt > self.RESTART_GAP:
+                    self._restart(ts); restarts += 1; dt = 0.0
+            self._now = ts; last = ts
+            if today_str(ts) != self._cur_day:
+                r0 = time.perf_counter()
+                self._rollover_if_needed(ts)
+                rollover_ms.append((time.perf_counter() - r0) * 1000.0)
+            self._sample(ts, dt, cpu, gpu, save_state=(n % state_every == 0))
+            n += 1
+            if progress and n % progress == 0:
+                print(f"  {n:,} samples  {ts:%Y-%m-%d %H:%M}  kWh={self._kwh:.3f}")
+        self.store.flush()
+        if n: self._save_state()
+        wall = time.perf_counter() - wall0
+        return {
+            "samples": n,
+            "simulated": str(last - first) if n else "0:00:00",
+            "wall_sec": wall,
+            "samples_per_sec": n / wall if wall > 0 else 0.0,
+            "rollovers": len(rollover_ms),
+            "rollover_ms_avg": sum(rollover_ms) / len(rollover_ms) if rollover_ms else 0.0,
+            "rollover_ms_max": max(rollover_ms, default=0.0),
+            "restarts": restarts,
+            "kwh": self._kwh,
+            "cost": self._cost,
+            "db_bytes": os.path.getsize(self.db_path),
+        }
+
+
 # ---------------- Autostart (Registry) ----------------
 def _pythonw_path():
     py = sys.executable; cand = os.path.join(os.path.dirname(py), "pythonw.exe")
@@ -402,28 +1092,21 @@ class SettingsDialog(Toplevel):
         self.destroy()
 
 
-class App(ctk.CTk):
+class App(Collector, ctk.CTk):
     def __init__(self, autostart_flag=False):
         super().__init__()
         self.title(APP_TITLE); self.geometry("900x560"); self.minsize(860,520)
 
-        # DB
-        self.conn = ensure_db()
-
         # Config
         self.cfg = load_config()
         apply_config_globals(self.cfg)
 
-        # state
-        self._running=False; self._t0=None
-        self._kwh=0.0; self._cost=0.0; self._watts=0.0; self._gpu_w=0.0
-        self._cur_day = today_str()
+        # DB + state (เลือก backend ตาม config "storage", resume เดือน/session จาก json)
+        self._init_collector(); self._start_session()
+        self._running=False
         self._tray = None
         self._overlay = None
 
-        # resume month/session (เก็บใน json ง่าย ๆ)
-        self._resume_state()
-
         # layout
         self.grid_columnconfigure(1, weight=1); self.grid_rowconfigure(1, weight=1)
         side=ctk.CTkFrame(self,width=260,corner_radius=0); side.grid(row=0,column=0,rowspan=2,sticky="nsew"); side.grid_propagate(False)
@@ -467,8 +1150,17 @@ class App(ctk.CTk):
         self.protocol("WM_DELETE_WINDOW", self.minimize_to_tray)
 
         self._ui_tick()
+        self.after(300, self._warn_tariff)
         if autostart_flag: self.after(500,self.start)
 
+    def _warn_tariff(self):
+        """แจ้งผู้ใช้ถ้า "tariff" ใน config ใช้ไม่ได้ (กำลังคิดค่าไฟแบบราคาเดียว)"""
+        if not TARIFF_ERROR:
+            return False
+        mb.showwarning("Tariff", f"ตั้งค่า tariff ใน config.json ไม่ถูกต้อง:\n{TARIFF_ERROR}\n\n"
+                                 f"ตอนนี้คิดค่าไฟแบบราคาเดียว {UNIT_PRICE:g} ฿/kWh")
+        return True
+
     # ---------- settings ----------
     def open_settings(self):
         dlg = SettingsDialog(self, self.cfg)
@@ -479,7 +1171,8 @@ class App(ctk.CTk):
         self.cfg.update(dlg.result)
         save_config(self.cfg)
         apply_config_globals(self.cfg)
-        mb.showinfo("Settings", "บันทึกและใช้ค่าใหม่เรียบร้อย")
+        if not self._warn_tariff():
+            mb.showinfo("Settings", "บันทึกและใช้ค่าใหม่เรียบร้อย")
 
     # ---------- utilities ----------
     def copy_text(self, text: str):
@@ -499,34 +1192,14 @@ class App(ctk.CTk):
         self.cfg.update(dlg.result)
         save_config(self.cfg)
         apply_config_globals(self.cfg)
-        mb.showinfo("Settings", "บันทึกและใช้ค่าใหม่เรียบร้อย")
-
-    # ---------- state persistence ----------
-    def _resume_state(self):
-        try:
-            with open(STATE_JSON,"r",encoding="utf-8") as f:
-                s=json.load(f)
-            mk = s.get("month_key", month_key())
-            if mk == month_key():
-                self._kwh = s.get("kwh",0.0); self._cost = s.get("cost",0.0)
-                t0 = s.get("t0"); self._t0 = datetime.fromisoformat(t0) if t0 else datetime.now()
-            else:
-                self._kwh = 0.0; self._cost = 0.0; self._t0 = datetime.now()
-        except Exception:
-            self._kwh = 0.0; self._cost = 0.0; self._t0 = datetime.now()
-        self._save_state()
-
-    def _save_state(self):
-        obj={"month_key":month_key(), "kwh":self._kwh, "cost":self._cost, "t0":self._t0.isoformat() if self._t0 else None}
-        try:
-            with open(STATE_JSON,"w",encoding="utf-8") as f: json.dump(obj,f,indent=2)
-        except: pass
+        if not self._warn_tariff():
+            mb.showinfo("Settings", "บันทึกและใช้ค่าใหม่เรียบร้อย")
 
     # ---------- month reset ----------
     def reset_month(self):
         if not mb.askyesno("Reset เดือน","เริ่มรอบใหม่เดือนนี้? (ค่าสะสมเดือนจะเป็น 0 แต่ daily_summary ยังอยู่)"):
             return
-        self._kwh=0.0; self._cost=0.0; self._t0=datetime.now()
+        self._kwh=0.0; self._cost=0.0; self._t0=self.clock()
         self._save_state()
 
     # ---------- export ----------
@@ -605,18 +1278,19 @@ class App(ctk.CTk):
     # ---------- core ----------
     def _elapsed_str(self):
         if not self._t0: return "0:00:00"
-        td = datetime.now() - self._t0
+        td = self.clock() - self._t0
         return str(timedelta(seconds=int(td.total_seconds())))
 
     def start(self):
         if self._running: return
-        self._running=True; self._t0=self._t0 or datetime.now()
+        self._running=True; self._t0=self._t0 or self.clock()
         self.btn_start.configure(state="disabled"); self.btn_stop.configure(state="normal")
         threading.Thread(target=self._loop, daemon=True).start()
 
     def stop(self):
         self._running=False
         self.btn_start.configure(state="normal"); self.btn_stop.configure(state="disabled")
+        self.store.flush()
         self._save_state()
 
     def toggle_overlay(self):
@@ -627,43 +1301,14 @@ class App(ctk.CTk):
             self._overlay = Overlay(self)
             self.minimize_to_tray()
 
-    def _rollover_if_needed(self, now):
-        # ถ้าข้ามวันจาก self._cur_day → สรุป self._cur_day ลง daily_summary แล้วลบ samples ของวันนั้น
-        day_now = today_str(now)
-        if day_now != self._cur_day:
-            try:
-                summarize_day(self.conn, self._cur_day)
-                delete_samples_of_day(self.conn, self._cur_day)
-            except Exception as e:
-                # ไม่หยุดโปรแกรม แค่แจ้งเตือนใน console
-                print("rollover error:", e)
-            self._cur_day = day_now
-
     def _loop(self):
-        last = datetime.now()
+        last = self.clock()
         # prime CPU meter ให้ interval=None ใช้งานได้แม่นขึ้น
         _ = psutil.cpu_percent(interval=None)
         while self._running:
-            now = datetime.now()
-            self._rollover_if_needed(now)
-
-            cpu_w = estimate_cpu_w(psutil.cpu_percent(interval=None))
-            gpu_w = estimate_gpu_w()
-            watts = cpu_w + gpu_w + MONITOR_W + OTHER_W
-
+            now = self.clock()
             dt = (now - last).total_seconds(); last = now
-            self._kwh = integrate_kwh(self._kwh, watts, dt)
-            self._cost = self._kwh * UNIT_PRICE
-            self._watts = watts; self._gpu_w = gpu_w
-
-            # เก็บ sample เฉพาะวันนี้ (เมื่อ rollover แล้วของเมื่อวานถูกลบไปแล้ว)
-            try:
-                insert_sample(self.conn, now, watts, self._kwh, self._cost)
-            except Exception as e:
-                print("insert sample error:", e)
-
-            # บันทึก state เดือน (เพื่อจำต่อเนื่องข้ามการรีสตาร์ท)
-            self._save_state()
+            self._sample(now, dt, psutil.cpu_percent(interval=None), estimate_gpu_w())
 
             # คุม loop timing ตาม SAMPLE_SEC จาก config
             time.sleep(max(0.0, SAMPLE_SEC))
@@ -673,7 +1318,8 @@ class App(ctk.CTk):
         self.kpi_gpu.set(f"{self._gpu_w:.1f}")
         self.kpi_kwh.set(f"{self._kwh:.4f}")
         self.kpi_cost.set(f"{self._cost:.2f}")
-        self.time_lbl.configure(text=f"⏱ {self._elapsed_str()}  |  DB: {DB_PATH}")
+        warn = f"  |  ⚠ tariff ผิด ใช้ราคาเดียว {UNIT_PRICE:g} ฿/kWh" if TARIFF_ERROR else ""
+        self.time_lbl.configure(text=f"⏱ {self._elapsed_str()}  |  DB: {DB_PATH}{warn}")
         self.after(300, self._ui_tick)
 
 
@@ -690,8 +1336,84 @@ if __name__=="__main__":
     parser.add_argument("--gpu-idle", type=float)
     parser.add_argument("--monitor-w", type=float)
     parser.add_argument("--other-w", type=float)
+    parser.add_argument("--storage", choices=["rows","chunks"])
+    parser.add_argument("--convert-storage", choices=["rows","chunks"],
+                        help="ย้าย samples ทั้งหมดจาก backend อื่นมาเป็น backend นี้ บันทึกเป็น storage ใน config แล้วออก")
+    parser.add_argument("--replay", metavar="TRACE",
+                        help="รัน pipeline กับ trace (CSV/NPY: timestamp,cpu_util,gpu_w) หรือ synthetic:DAYS แล้วออก")
+    parser.add_argument("--replay-db", default=os.path.join(DATA_DIR, "replay.sqlite3"),
+                        help="DB สำหรับ replay (ลบและสร้างใหม่ทุกครั้ง; ไม่ยอมลบ DB จริงหรือไฟล์ที่ replay ไม่ได้สร้าง)")
+    parser.add_argument("--replay-state-every", type=int, default=1,
+                        help="เขียน state.json ทุก ๆ N samples (1 = เหมือนของจริง)")
+    parser.add_argument("--replay-fsync", action="store_true",
+                        help="ใช้ synchronous ปกติของ SQLite (ช้ากว่า แต่ latency ใกล้ของจริง)")
+    parser.add_argument("--reprice", metavar="TARIFF_JSON",
+                        help="คิดค่าไฟของ samples ที่เก็บไว้ใหม่ด้วย tariff ในไฟล์ JSON เทียบกับ tariff ปัจจุบัน แล้วออก")
+    parser.add_argument("--reprice-from", metavar="YYYY-MM-DD")
+    parser.add_argument("--reprice-to", metavar="YYYY-MM-DD", help="ไม่รวมวันนี้")
+    parser.add_argument("--stats", nargs=2, metavar=("FROM","TO"),
+                        help="สรุป watts ของ samples ช่วง [FROM, TO) (ISO วันที่/เวลา) แล้วออก")
     args=parser.parse_args()
 
+    if args.stats:
+        apply_config_globals(load_config())
+        store = open_store(ensure_db(), args.storage)
+        t0, t1 = (datetime.fromisoformat(v) for v in args.stats)
+        st = store.range_stats(t0, t1)
+        if not st:
+            print("ไม่มี samples ในช่วงที่เลือก")
+        else:
+            print(f"samples: {st['n']}  avg: {st['w_sum']/st['n']:.1f} W  "
+                  f"min: {st['w_min']:.1f} W  max: {st['w_max']:.1f} W")
+        sys.exit(0)
+
+    if args.reprice:
+        cfg = load_config(); apply_config_globals(cfg)
+        with open(args.reprice, "r", encoding="utf-8") as f:
+            alt = Tariff.from_spec(json.load(f), UNIT_PRICE)
+        store = open_store(ensure_db(), args.storage)
+        t0 = datetime.fromisoformat(args.reprice_from) if args.reprice_from else datetime(2000, 1, 1)
+        t1 = datetime.fromisoformat(args.reprice_to) if args.reprice_to else datetime.now() + timedelta(days=1)
+        w0 = time.perf_counter()
+        kwh, cur_cost = store.reprice(TARIFF, t0, t1)
+        _, alt_cost = store.reprice(alt, t0, t1)
+        print(f"kWh: {kwh:.4f}  current: {cur_cost:.2f} ฿  alternative: {alt_cost:.2f} ฿  "
+              f"({(time.perf_counter() - w0)*1000:.0f} ms)")
+        sys.exit(0)
+
+    if args.replay:
+        cfg = load_config()
+        for k in ("unit_price","sample_sec","storage"):
+            v = getattr(args, k)
+            if v is not None: cfg[k] = v
+        apply_config_globals(cfg)
+        if args.replay.startswith("synthetic:"):
+            start = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+            trace = synthetic_trace(start, float(args.replay.split(":",1)[1]))
+        else:
+            trace = load_trace(args.replay)
+        try:
+            rp = Replay(args.replay_db, fsync=args.replay_fsync)
+            report = rp.run(trace, state_every=max(1, args.replay_state_every), progress=100_000)
+        except ValueError as e:
+            print("replay error:", e); sys.exit(1)
+        for k, v in report.items():
+            print(f"{k:>16}: {v:,.3f}" if isinstance(v, float) else f"{k:>16}: {v}")
+        sys.exit(0)
+
+    if args.convert_storage:
+        cfg = load_config(); apply_config_globals(cfg)
+        conn = ensure_db()
+        dst = open_store(conn, args.convert_storage)
+        src = open_store(conn, "rows" if args.convert_storage == "chunks" else "chunks")
+        n = convert_store(src, dst)
+        table = "samples" if src.kind == "rows" else "sample_chunks"
+        conn.execute(f"DELETE FROM {table}"); conn.commit()
+        # ให้การเปิดครั้งถัดไปใช้ backend ที่เพิ่งย้ายข้อมูลไป
+        cfg["storage"] = dst.kind; save_config(cfg)
+        print(f"converted {n} samples: {src.kind} -> {dst.kind} (config storage = {dst.kind})")
+        sys.exit(0)
+
     app=App(autostart_flag=args.autostart)
 
     # ถ้ามีค่า override ก็อัปเดต/เซฟ/ใช้ทันที
@@ -704,13 +1426,16 @@ if __name__=="__main__":
         "gpu_idle": args.gpu_idle,
         "monitor_w": args.monitor_w,
         "other_w": args.other_w,
+        "storage": args.storage,
     }
     changed = False
     for k, v in list(overrides.items()):
         if v is not None:
-            app.cfg[k] = float(v); changed = True
+            app.cfg[k] = v if k == "storage" else float(v); changed = True
     if changed:
         save_config(app.cfg)
         apply_config_globals(app.cfg)
+        if args.storage and app.store.kind != STORAGE:
+            app.store.flush(); app.store = open_store(app.conn)
 
     app.mainloop()
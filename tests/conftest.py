@@ -0,0 +1,46 @@
+# ให้ import power_gui_modern ได้บนเครื่องที่ไม่มี Windows/GUI deps (CI, Linux):
+# module ไหน import ไม่ได้จะถูกแทนด้วย stub เปล่า ๆ — test ใช้แค่ส่วน storage/replay/tariff ที่ไม่แตะ GUI
+import os, sys, types
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _stub(name, **attrs):
+    try:
+        __import__(name)
+    except ImportError:
+        mod = types.ModuleType(name)
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+
+
+_stub("winreg")
+_stub("psutil", cpu_percent=lambda interval=None: 0.0)
+_stub("pystray")
+_stub("PIL.Image"); _stub("PIL.ImageDraw")
+_stub("PIL", Image=sys.modules["PIL.Image"], ImageDraw=sys.modules["PIL.ImageDraw"])
+_stub("tkinter.messagebox", showinfo=lambda *a, **k: None, showerror=lambda *a, **k: None,
+      showwarning=lambda *a, **k: None, askyesno=lambda *a, **k: False)
+_stub("tkinter.filedialog")
+_stub("tkinter", messagebox=sys.modules["tkinter.messagebox"], filedialog=sys.modules["tkinter.filedialog"],
+      Toplevel=object, StringVar=object)
+_stub("customtkinter", CTk=object, CTkFrame=object, CTkToplevel=object,
+      set_appearance_mode=lambda *a: None, set_default_color_theme=lambda *a: None)
+
+import power_gui_modern  # noqa: E402
+
+
+@pytest.fixture
+def pg():
+    return power_gui_modern
+
+
+@pytest.fixture
+def setcfg(pg):
+    """ตั้ง config globals ชั่วคราว (คืนค่า default หลังจบ test)"""
+    def _set(**kw):
+        cfg = dict(pg.DEFAULT_CONFIG); cfg.update(kw)
+        pg.apply_config_globals(cfg)
+    yield _set
+    pg.apply_config_globals(pg.DEFAULT_CONFIG)
@@ -0,0 +1,32 @@
+# ทดสอบ format BLOB ของ sample_chunks
+import power_gui_modern as pg
+
+
+def _roundtrip(t_ms, w_q):
+    t_out, w_out = pg.decode_chunk(t_ms[0], pg.encode_chunk(t_ms, w_q))
+    assert t_out == t_ms
+    assert [int(round(w * 10)) for w in w_out] == w_q
+
+
+def test_varint_roundtrip_signed():
+    vals = [0, 1, -1, 63, -64, 64, -65, 127, 128, -129, 2**31, -2**31, 2**62, -2**62]
+    buf = bytearray()
+    for v in vals:
+        pg._put_varint(buf, v)
+    assert pg._read_varints(bytes(buf)) == vals
+
+
+def test_chunk_roundtrip_regular():
+    t0 = 1_767_225_600_000
+    _roundtrip([t0 + 1000*i for i in range(900)], [1000 + (i % 7) for i in range(900)])
+
+
+def test_chunk_roundtrip_negative_deltas_irregular_ts():
+    t_ms = [1_767_225_600_000, 1_767_225_600_999, 1_767_225_602_000, 1_767_225_602_001,
+            1_767_225_612_500, 1_767_225_612_500, 1_767_225_613_437]
+    w_q = [1500, 200, 98765, 0, -3, 4_000_000, 1]
+    _roundtrip(t_ms, w_q)
+
+
+def test_chunk_roundtrip_single_sample():
+    _roundtrip([1_767_225_600_123], [457])
@@ -0,0 +1,72 @@
+# Replay ป้อน trace ผ่าน pipeline จริง (integrate → insert_sample → rollover → summary → state)
+import json
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture(params=["rows", "chunks"])
+def replay(request, pg, setcfg, tmp_path):
+    def _make(**cfg):
+        setcfg(storage=request.param, unit_price=4.0, **cfg)
+        return pg.Replay(str(tmp_path / "replay.sqlite3"))
+    return _make
+
+
+def test_day_rollover_keeps_samples(pg, replay):
+    rp = replay(keep_samples=True)
+    report = rp.run(pg.synthetic_trace(datetime(2026, 3, 10, 8), 2, step=60))
+    # เปิด 08:00–01:00 ทุกวัน → ข้ามเที่ยงคืน 2 ครั้ง, ปิดเครื่องกลางคืน 1 ครั้ง (รีสตาร์ท)
+    assert report["rollovers"] == 2 and report["restarts"] == 1
+    days = rp.conn.execute("SELECT day, kwh, cost FROM daily_summary ORDER BY day").fetchall()
+    assert [d for d, *_ in days] == ["2026-03-10", "2026-03-11"]
+    for _, kwh, cost in days:
+        assert kwh > 0 and cost == pytest.approx(kwh * 4.0)
+    # ยังอยู่เดือนเดิม → ค่าสะสมเดือน = ผลรวมรายวัน + วันนี้ (ต่างกันแค่ sample แรกของแต่ละวัน)
+    today = rp.store.range_stats(datetime(2026, 3, 12), datetime(2026, 3, 13))
+    assert today is not None
+    assert rp._kwh > sum(k for _, k, _ in days)
+    assert rp.store.range_stats(datetime(2026, 3, 10), datetime(2026, 3, 11))["n"] > 0
+
+
+def test_month_rollover_resets_and_deletes_samples(pg, replay):
+    rp = replay(keep_samples=False)
+    # 31 ม.ค. 08:00 → 1 ก.พ. 23:00: ข้ามเดือนตอนโปรแกรมเปิดอยู่ แล้วรีสตาร์ทตอน 08:00 ของวันที่ 1
+    report = rp.run(pg.synthetic_trace(datetime(2026, 1, 31, 8), 39 / 24, step=60))
+    assert report["rollovers"] == 1 and report["restarts"] == 1
+    (day, kwh, cost), = rp.conn.execute("SELECT day, kwh, cost FROM daily_summary").fetchall()
+    assert day == "2026-01-31" and kwh > 0 and cost == pytest.approx(kwh * 4.0)
+    # samples ของ 31 ม.ค. ถูกลบตอน rollover เหลือเฉพาะวันนี้
+    assert rp.store.range_stats(datetime(2026, 1, 31), datetime(2026, 2, 1)) is None
+    assert rp.store.range_stats(datetime(2026, 2, 1), datetime(2026, 2, 2))["n"] > 0
+    # ค่าสะสมเดือน reset ที่วันที่ 1: เหลือเฉพาะพลังงานของ ก.พ. (ไม่ reset จะได้ ≈ ม.ค. + ก.พ.)
+    feb_kwh, _ = rp.store.reprice(pg.TARIFF, datetime(2026, 2, 1), datetime(2026, 2, 2))
+    assert rp._kwh == pytest.approx(feb_kwh, abs=0.005)
+    assert rp._cost == pytest.approx(rp._kwh * 4.0)
+    with open(rp.state_path, encoding="utf-8") as f:
+        state = json.load(f)
+    assert state["month_key"] == "2026-02" and state["kwh"] == pytest.approx(rp._kwh)
+
+
+def test_backwards_trace_rejected(pg, replay):
+    rp = replay()
+    trace = [(datetime(2026, 3, 1, 10, 0, 1), 10.0, 20.0), (datetime(2026, 3, 1, 10, 0, 0), 10.0, 20.0)]
+    with pytest.raises(ValueError, match="#2"):
+        rp.run(iter(trace))
+
+
+def test_refuses_real_or_foreign_db(pg, setcfg, tmp_path, monkeypatch):
+    setcfg()
+    real = tmp_path / "power.sqlite3"
+    monkeypatch.setattr(pg, "DB_PATH", str(real))
+    with pytest.raises(ValueError):
+        pg.Replay(str(real))
+    foreign = tmp_path / "other.sqlite3"
+    pg.ensure_db(str(foreign)).close()
+    with pytest.raises(ValueError):
+        pg.Replay(str(foreign))
+    assert foreign.exists()
+    # DB ที่ replay สร้างเองสร้างใหม่ทับได้
+    own = str(tmp_path / "own.sqlite3")
+    pg.Replay(own).conn.close()
+    pg.Replay(own)
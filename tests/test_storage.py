@@ -0,0 +1,160 @@
+# RowStore กับ ChunkStore ต้องให้ผลเหมือนกันเมื่อป้อน samples ชุดเดียวกัน
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+
+def _trace(start, seconds, reset_at=None, seed=1):
+    """samples ถี่ 1 วินาที (มีเศษ microsecond), watts ละเอียด 0.1 W, kWh สะสม (reset เป็น 0 ที่ reset_at)"""
+    rnd = random.Random(seed)
+    t, kwh, w, dt = start, 0.0, 120.0, 0.0
+    out = []
+    for _ in range(seconds):
+        w = round(min(300.0, max(20.0, w + rnd.uniform(-5, 5))), 1)
+        if reset_at and out and out[-1][0] < reset_at <= t:
+            kwh = 0.0
+        kwh = (kwh + w * dt / 3_600_000.0)
+        out.append((t, w, kwh, kwh * 4.0))
+        step = timedelta(seconds=1, microseconds=rnd.randrange(-2000, 2000))
+        t += step; dt = step.total_seconds()
+    return out
+
+
+@pytest.fixture
+def stores(pg, setcfg, tmp_path):
+    setcfg(chunk_sec=900.0)
+    conn = pg.ensure_db(str(tmp_path / "power.sqlite3"))
+    conn.execute("PRAGMA synchronous=OFF")   # RowStore commit ทุก sample
+    return conn, pg.RowStore(conn), pg.ChunkStore(conn)
+
+
+def _feed(trace, *stores):
+    for s in stores:
+        for row in trace:
+            s.insert_sample(*row)
+        s.flush()
+
+
+def test_summarize_day_matches(pg, stores):
+    conn, rows, chunks = stores
+    trace = _trace(datetime(2026, 1, 31, 23, 0, 0, 250000), 7200, reset_at=datetime(2026, 2, 1))
+    _feed(trace, rows, chunks)
+    for day in ("2026-01-31", "2026-02-01"):
+        assert rows.summarize_day(day)
+        r = conn.execute("SELECT * FROM daily_summary WHERE day=?", (day,)).fetchone()
+        assert chunks.summarize_day(day)
+        c = conn.execute("SELECT * FROM daily_summary WHERE day=?", (day,)).fetchone()
+        # day, kwh, cost, seconds, avg_watts, max_watts, last_watts — seconds ของ chunk ละเอียดระดับ ms
+        assert c[0] == r[0]
+        assert c[3] == pytest.approx(r[3], abs=0.002)
+        assert c[1:3] + c[4:] == pytest.approx(r[1:3] + r[4:], rel=1e-9)
+
+
+def test_range_stats_matches(pg, stores):
+    conn, rows, chunks = stores
+    _feed(_trace(datetime(2026, 3, 1, 10), 5400), rows, chunks)
+    for t0, t1 in [(datetime(2026, 3, 1, 10, 3, 7), datetime(2026, 3, 1, 11, 20, 1)),
+                   (datetime(2026, 3, 1, 10, 15), datetime(2026, 3, 1, 10, 45)),
+                   (datetime(2026, 3, 1), datetime(2026, 3, 2))]:
+        r, c = rows.range_stats(t0, t1), chunks.range_stats(t0, t1)
+        assert r["n"] == c["n"]
+        assert c["w_sum"] == pytest.approx(r["w_sum"], rel=1e-9)
+        assert (c["w_min"], c["w_max"]) == pytest.approx((r["w_min"], r["w_max"]))
+    assert rows.range_stats(datetime(2027, 1, 1), datetime(2027, 1, 2)) is None
+    assert chunks.range_stats(datetime(2027, 1, 1), datetime(2027, 1, 2)) is None
+
+
+def test_iter_samples_and_convert(pg, stores, tmp_path):
+    conn, rows, chunks = stores
+    trace = _trace(datetime(2026, 3, 1, 10), 2000)
+    _feed(trace, rows, chunks)
+    r, c = list(rows.iter_samples()), list(chunks.iter_samples())
+    assert len(r) == len(c) == len(trace)
+    for (rt, rw, rk, _), (ct, cw, ck, _) in zip(r, c):
+        # chunk เก็บเวลาเป็น ms และ watts ละเอียด 0.1 W
+        assert abs((rt - ct).total_seconds()) < 0.001
+        assert cw == pytest.approx(rw, abs=0.05)
+        assert ck == pytest.approx(rk, abs=1e-6)
+
+    conn2 = pg.ensure_db(str(tmp_path / "converted.sqlite3"))
+    dst = pg.ChunkStore(conn2)
+    assert pg.convert_store(rows, dst) == len(trace)
+    assert dst.summarize_day("2026-03-01") and rows.summarize_day("2026-03-01")
+    got = conn2.execute("SELECT kwh, avg_watts, max_watts FROM daily_summary").fetchone()
+    want = conn.execute("SELECT kwh, avg_watts, max_watts FROM daily_summary").fetchone()
+    assert got == pytest.approx(want, rel=1e-9)
+
+
+def test_chunk_reopened_after_restart(pg, stores):
+    conn, _, chunks = stores
+    trace = _trace(datetime(2026, 3, 1, 10), 600)
+    for row in trace[:250]:
+        chunks.insert_sample(*row)
+    chunks.flush()
+    # store ใหม่ (เหมือนเปิดโปรแกรมใหม่) ต้องต่อ chunk เดิม ไม่ทับ
+    again = pg.ChunkStore(conn)
+    for row in trace[250:]:
+        again.insert_sample(*row)
+    again.flush()
+    assert conn.execute("SELECT COUNT(*), SUM(n) FROM sample_chunks").fetchone() == (1, 600)
+    assert [t for t, *_ in again.iter_samples()][-1] == pytest.approx(trace[-1][0], abs=timedelta(milliseconds=1))
+    n, kwh_sum = conn.execute("SELECT n, kwh_sum FROM sample_chunks").fetchone()
+    assert kwh_sum == pytest.approx(trace[-1][2] - trace[0][2], rel=1e-9)
+
+
+def test_chunk_kwh_sum_ignores_drops(pg, stores):
+    conn, _, chunks = stores
+    t = datetime(2026, 3, 1, 10)
+    for i, kwh in enumerate([1.0, 1.5, 2.0, 0.25, 0.5, 0.75]):   # ลดลงที่ sample ที่ 4 (reset)
+        chunks.insert_sample(t + timedelta(seconds=i), 100.0, kwh, kwh * 4)
+    chunks.flush()
+    assert conn.execute("SELECT kwh_sum FROM sample_chunks").fetchone()[0] == pytest.approx(1.0 + 0.5)
+
+
+def test_chunk_sec_must_align_with_slots(pg, stores):
+    conn, _, _ = stores
+    with pytest.raises(ValueError):
+        pg.ChunkStore(conn, chunk_sec=7)
+    with pytest.raises(ValueError):
+        pg.ChunkStore(conn, chunk_sec=1200)   # หาร 86400 ได้ แต่คร่อมขอบช่อง 15 นาที
+
+
+@pytest.mark.parametrize("chunk_sec", [300, 900, 3600])
+def test_reprice_matches_rows(pg, stores, chunk_sec):
+    conn, rows, _ = stores
+    chunks = pg.ChunkStore(conn, chunk_sec=chunk_sec)
+    tariff = pg.Tariff.from_spec({"base": 4.0, "rules": [{"start": "09:15", "end": "10:45", "rate": 6.0}]}, 4.0)
+    _feed(_trace(datetime(2026, 3, 2, 8, 50), 3 * 3600), rows, chunks)
+    for t0, t1 in [(datetime(2026, 3, 2), datetime(2026, 3, 3)),
+                   (datetime(2026, 3, 2, 9, 7), datetime(2026, 3, 2, 10, 52))]:
+        (rk, rc), (ck, cc) = rows.reprice(tariff, t0, t1), chunks.reprice(tariff, t0, t1)
+        assert ck == pytest.approx(rk, rel=1e-6)
+        assert cc == pytest.approx(rc, rel=1e-6)
+
+
+def test_hourly_reprice_uses_header_without_decoding(pg, stores, monkeypatch):
+    conn, rows, _ = stores
+    chunks = pg.ChunkStore(conn, chunk_sec=3600)
+    _feed(_trace(datetime(2026, 3, 2, 9), 2 * 3600), rows, chunks)
+    assert conn.execute("SELECT COUNT(*) FROM sample_chunks WHERE length(slot_kwh) = 32").fetchone()[0] == 2
+    tariff = pg.Tariff.from_spec({"base": 4.0, "rules": [{"start": "09:30", "end": "10:15", "rate": 6.0}]}, 4.0)
+    want = rows.reprice(tariff, datetime(2026, 3, 2), datetime(2026, 3, 3))
+    monkeypatch.setattr(pg, "decode_chunk", None)   # chunk ทั้งก้อนต้องไม่ถูก decode
+    assert chunks.reprice(tariff, datetime(2026, 3, 2), datetime(2026, 3, 3)) == pytest.approx(want, rel=1e-6)
+
+
+def test_legacy_chunk_without_slot_kwh(pg, stores):
+    conn, rows, _ = stores
+    chunks = pg.ChunkStore(conn, chunk_sec=3600)
+    _feed(_trace(datetime(2026, 3, 2, 9), 1800), rows, chunks)
+    conn.execute("UPDATE sample_chunks SET slot_kwh=NULL"); conn.commit()
+    tariff = pg.Tariff.from_spec({"base": 4.0, "rules": [{"start": "09:15", "end": "09:30", "rate": 6.0}]}, 4.0)
+    want = rows.reprice(tariff, datetime(2026, 3, 2), datetime(2026, 3, 3))
+    # แถวเก่าต้อง decode แล้วแบ่งพลังงานตาม watts x dt → ใกล้เคียง ไม่ตรงเป๊ะ
+    assert chunks.reprice(tariff, datetime(2026, 3, 2), datetime(2026, 3, 3)) == pytest.approx(want, rel=1e-3)
+    # ต่อ chunk เดิมหลังรีสตาร์ท → สร้าง slot_kwh ใหม่จาก samples
+    again = pg.ChunkStore(conn, chunk_sec=3600)
+    again.insert_sample(datetime(2026, 3, 2, 9, 30, 1), 100.0, 1.0, 4.0)
+    again.flush()
+    assert conn.execute("SELECT slot_kwh IS NOT NULL FROM sample_chunks").fetchone()[0]
@@ -0,0 +1,55 @@
+# ตาราง rate ของ Tariff.from_spec
+from datetime import datetime
+
+import pytest
+
+TOU = {"base": 2.6369,
+       "rules": [{"days": [0, 1, 2, 3, 4], "start": "09:00", "end": "22:00", "rate": 5.7982}],
+       "holidays": ["2026-01-01"]}
+
+
+def test_weekday_peak_and_holiday(pg):
+    t = pg.Tariff.from_spec(TOU, 8.0)
+    assert t.rate_at(datetime(2026, 1, 2, 9, 0)) == 5.7982       # ศุกร์ 09:00
+    assert t.rate_at(datetime(2026, 1, 2, 8, 59)) == 2.6369
+    assert t.rate_at(datetime(2026, 1, 2, 22, 0)) == 2.6369
+    assert t.rate_at(datetime(2026, 1, 3, 12, 0)) == 2.6369      # เสาร์
+    assert t.rate_at(datetime(2026, 1, 1, 12, 0)) == 2.6369      # วันหยุด (พฤหัส)
+
+
+def test_flat_when_no_spec(pg):
+    assert pg.Tariff.from_spec(None, 8.0).rate_at(datetime(2026, 1, 2, 12)) == 8.0
+
+
+def test_cross_midnight_goes_to_next_day(pg):
+    t = pg.Tariff.from_spec({"base": 1.0, "rules": [{"days": [4], "start": "22:00", "end": "02:00", "rate": 9.0}]}, 1.0)
+    assert t.rate_at(datetime(2026, 1, 2, 23, 0)) == 9.0         # ศุกร์ 23:00
+    assert t.rate_at(datetime(2026, 1, 3, 1, 0)) == 9.0          # เสาร์ 01:00
+    assert t.rate_at(datetime(2026, 1, 3, 2, 0)) == 1.0
+    assert t.rate_at(datetime(2026, 1, 2, 1, 0)) == 1.0          # ศุกร์ 01:00 ไม่ใช่ของกฎนี้
+
+
+def test_cross_midnight_sunday_wraps_to_monday(pg):
+    t = pg.Tariff.from_spec({"base": 1.0, "rules": [{"days": [6], "start": "23:00", "end": "06:00", "rate": 3.0}]}, 1.0)
+    assert t.rate_at(datetime(2026, 1, 4, 23, 30)) == 3.0        # อาทิตย์
+    assert t.rate_at(datetime(2026, 1, 5, 5, 45)) == 3.0         # จันทร์
+    assert t.rate_at(datetime(2026, 1, 4, 5, 45)) == 1.0
+    assert t.rate_at(datetime(2026, 1, 5, 6, 0)) == 1.0
+
+
+@pytest.mark.parametrize("rule", [
+    {"days": [0], "start": "24:00", "end": "06:00", "rate": 9},
+    {"days": [7], "start": "09:00", "end": "10:00", "rate": 9},
+    {"days": [-1], "rate": 9},
+    {"start": "9:07", "end": "10:00", "rate": 9},
+])
+def test_invalid_rules_rejected(pg, rule):
+    with pytest.raises(ValueError):
+        pg.Tariff.from_spec({"rules": [rule]}, 1.0)
+
+
+def test_bad_tariff_config_is_recorded(pg, setcfg):
+    setcfg(unit_price=4.5, tariff={"rules": [{"days": [7], "rate": 9}]})
+    assert pg.TARIFF_ERROR and pg.TARIFF.rate_at(datetime(2026, 1, 5, 12)) == 4.5
+    setcfg(tariff=TOU)
+    assert pg.TARIFF_ERROR is None